@@ -1,6 +1,6 @@
 from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi_utils.tasks import repeat_every
 
 from aag.weather import CloudSensor
@@ -17,11 +17,13 @@ def init_sensor():
 
 @app.on_event('startup')
 @repeat_every(seconds=30, wait_first=True)
-def get_reading():
+async def get_reading():
     """ Get a single reading of all values."""
-    return sensor.get_reading()
+    return await sensor.get_reading_async()
 
 
 @app.get('/weather')
 def main():
-    return sensor.readings
+    with sensor.readings_lock:
+        content = b'[' + b','.join(sensor.readings_json) + b']'
+    return Response(content=content, media_type='application/json')
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, model_validator
 from enum import StrEnum
 
 
@@ -10,6 +10,9 @@ class WhichUnits(StrEnum):
 
 
 class Thresholds(BaseModel):
+    # Check the order again when a single threshold is changed.
+    model_config = ConfigDict(validate_assignment=True)
+
     cloudy: float = -25
     very_cloudy: float = -15
     windy: float = 50
@@ -19,6 +22,20 @@ class Thresholds(BaseModel):
     wet: int = 2200
     rainy: int = 1800
 
+    @model_validator(mode='after')
+    def check_order(self) -> 'Thresholds':
+        """Checks that each set of thresholds is sorted, as the safety checks assume."""
+        bands = {
+            'cloud': (self.cloudy, self.very_cloudy),
+            'wind': (self.windy, self.very_windy, self.gusty, self.very_gusty),
+            # Lower rain frequencies are wetter.
+            'rain': (self.rainy, self.wet),
+        }
+        for name, values in bands.items():
+            if list(values) != sorted(values):
+                raise ValueError(f'The {name} thresholds are out of order: {values}')
+        return self
+
 
 class Heater(BaseModel):
     min_power: float = 0
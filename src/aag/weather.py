@@ -1,20 +1,99 @@
-import re
+import asyncio
+import bisect
+import inspect
+import json
+import threading
 import time
 from datetime import datetime
 
 import serial
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
 from collections import deque
 from contextlib import suppress
 
-from astropy import units as u
 from rich import print
 
 from aag.commands import WeatherCommand, WeatherResponseCodes
 from aag.settings import WeatherSettings, WhichUnits, Thresholds
 
+KPH_TO_MPH = 0.621371
+
+# The (scale, offset) to convert each metric field to imperial units.
+IMPERIAL_CONVERSIONS = {
+    'ambient_temp': (9 / 5, 32),
+    'sky_temp': (9 / 5, 32),
+    'wind_speed': (KPH_TO_MPH, 0),
+}
+
+# Conversions from the raw sensor values.
+TEMPERATURE_DIVISOR = 100.
+WIND_SPEED_FACTOR = 0.84
+PWM_MAX = 1023
+PWM_TO_PERCENT = 100 / PWM_MAX
+PERCENT_TO_PWM = PWM_MAX / 100
+
+# Every response is made of fixed-size blocks and ends with the handshake block.
+HANDSHAKE_BLOCK = b'!\x11' + b' ' * 12 + b'0'
+BLOCK_SIZE = len(HANDSHAKE_BLOCK)
+
+# Encoded commands without any parameters.
+COMMAND_BYTES = {cmd: f'{cmd.value}!'.encode() for cmd in WeatherCommand}
+
+# Commands queried for every reading, with GET_WINDSPEED added if there is an anemometer.
+READING_COMMANDS = (
+    WeatherCommand.GET_SENSOR_TEMP,
+    WeatherCommand.GET_SKY_TEMP,
+    WeatherCommand.GET_RAIN_FREQUENCY,
+)
+
+# Conditions for each band between the sorted thresholds.
+CLOUD_CONDITIONS = ('clear', 'cloudy', 'very cloudy')
+WIND_CONDITIONS = ('calm', 'windy', 'very windy', 'gusty', 'very gusty')
+RAIN_CONDITIONS = ('rainy', 'wet', 'dry')
+
+# Parsers for the value of each block returned by the GET_VALUES command.
+RAIN_SENSOR_PARSERS = {
+    WeatherResponseCodes.GET_VALUES_AMBIENT: lambda value: float(value) / TEMPERATURE_DIVISOR,
+    WeatherResponseCodes.GET_VALUES_LDR_VOLTAGE: float,
+    WeatherResponseCodes.GET_VALUES_SENSOR_TEMP: lambda value: float(value) / TEMPERATURE_DIVISOR,
+    WeatherResponseCodes.GET_VALUES_ZENER_VOLTAGE: float,
+}
+
+# Values the sensor uses for a true flag.
+TRUE_VALUES = frozenset({'1', 'Y', 'YES', 'TRUE'})
+
+# The response code at the start of the response to each command.
+RESPONSE_CODES = {
+    cmd: str(WeatherResponseCodes[cmd.name])
+    for cmd in WeatherCommand
+    if cmd.name in WeatherResponseCodes.__members__
+}
+# The sensor answers SET_PWM with the new PWM value, as for GET_PWM.
+RESPONSE_CODES[WeatherCommand.SET_PWM] = str(WeatherResponseCodes.GET_PWM)
+
+
+def _parse_bool(value: str) -> bool:
+    """Parses a flag returned by the sensor, e.g. for CAN_GET_WINDSPEED."""
+    return value.strip().upper() in TRUE_VALUES
+
+
+def _next_deadline(deadline: float, period: float) -> float:
+    """Returns the monotonic time of the next reading, skipping any that were missed."""
+    return max(deadline + period, time.monotonic())
+
+
+def _average(values: list[float], scale: float = 1.) -> float:
+    """Returns the scaled mean of the values, rounded to three decimals."""
+    return round(sum(values) / len(values) * scale, 3)
+
 
 class CloudSensor(object):
+    __slots__ = (
+        'config', '_sensor', '_read_buf', '_serial_lock', 'readings_lock',
+        'readings', 'readings_json', 'name', 'firmware', 'serial_number', 'has_anemometer', '_is_connected',
+        '_reading_commands',
+    )
+
     def __init__(self, connect: bool = True, **kwargs):
         """ A class to read the cloud sensor.
 
@@ -30,23 +109,29 @@ class CloudSensor(object):
                                                                 timeout=1,
                                                                 do_not_open=True
                                                                 )
-            if connect:
-                self._sensor.open()
-                self._sensor.reset_input_buffer()
-                self._sensor.reset_output_buffer()
         except serial.serialutil.SerialException as e:
             print(f'[red]Unable to connect to weather sensor. Check the port. {e}')
             raise e
 
-        self.handshake_block = r'\x11\s{12}0'
+        # Holds the bytes received from the sensor that have not been read yet.
+        self._read_buf = bytearray()
+
+        # Serializes the write/read transactions on the port across threads.
+        self._serial_lock = threading.Lock()
 
-        # Set up a queue for readings
+        # Set up a queue for readings, and the same readings encoded once as JSON
+        # so the server doesn't re-serialize them on every request.
         self.readings = deque(maxlen=self.config.num_readings)
+        self.readings_json: deque[bytes] = deque(maxlen=self.config.num_readings)
+
+        # Keeps the two queues in step; hold it to iterate over either one.
+        self.readings_lock = threading.Lock()
 
         self.name: str = 'CloudWatcher'
         self.firmware: str | None = None
         self.serial_number: str | None = None
         self.has_anemometer: bool = False
+        self._reading_commands: tuple[WeatherCommand, ...] = READING_COMMANDS
 
         self._is_connected: bool = False
 
@@ -83,7 +168,22 @@ class CloudSensor(object):
             True if connected, False otherwise.
         """
         try:
-            self._sensor.is_open or self._sensor.open()
+            # The port setup is a transaction like any other. The lock is not
+            # re-entrant, so it is released before the queries below.
+            with self._serial_lock:
+                # Only flush the output of a freshly opened port.
+                if not self._sensor.is_open:
+                    self._sensor.open()
+                    self._sensor.reset_output_buffer()
+
+                # Drop any stale input, e.g. when reconnecting after a bad
+                # response, so the responses below line up with their queries.
+                self._resync()
+
+                # Ask the USB serial driver to deliver bytes as soon as they arrive
+                # rather than batching them. Not all ports support this.
+                with suppress(AttributeError, NotImplementedError, ValueError):
+                    self._sensor.set_low_latency_mode(True)
 
             # Initialize and get static values.
             self.name = self.query(WeatherCommand.GET_INTERNAL_NAME)
@@ -91,7 +191,10 @@ class CloudSensor(object):
             self.serial_number = self.query(WeatherCommand.GET_SERIAL_NUMBER, parse_type=str)[0:4]
 
             # Check if we have wind speed.
-            self.has_anemometer = self.query(WeatherCommand.CAN_GET_WINDSPEED, parse_type=bool)
+            self.has_anemometer = self.query(WeatherCommand.CAN_GET_WINDSPEED, parse_type=_parse_bool)
+            self._reading_commands = READING_COMMANDS
+            if self.has_anemometer:
+                self._reading_commands += (WeatherCommand.GET_WINDSPEED,)
 
             # Set the PWM to the minimum to start.
             self.set_pwm(self.config.heater.min_power)
@@ -108,65 +211,146 @@ class CloudSensor(object):
     def capture(self, callback: Callable | None = None, units: WhichUnits = 'none') -> None:
         """Captures readings continuously.
 
+        Readings start every `capture_delay` seconds regardless of how long
+        each one takes. If a reading overruns, the next one starts right away.
+
         Args:
             callback: A function to call with each reading.
         """
         try:
+            deadline = time.monotonic()
             while True:
                 reading = self.get_reading(units=units)
 
                 if callback is not None:
                     callback(reading)
 
-                time.sleep(self.config.capture_delay)
+                deadline = _next_deadline(deadline, self.config.capture_delay)
+                time.sleep(max(0., deadline - time.monotonic()))
         except KeyboardInterrupt:
             pass
 
+    async def capture_async(self, callback: Callable | None = None, units: WhichUnits = 'none') -> None:
+        """Captures readings continuously without blocking the event loop.
+
+        The blocking serial queries are run in a worker thread. If the callback
+        is a coroutine function it is scheduled as a task, so it runs while the
+        next reading is being taken. An exception from the callback stops the
+        capture, and any callbacks still running are cancelled when it stops.
+
+        Args:
+            callback: A function or coroutine function to call with each reading.
+            units: The units to return the readings in, default 'none'.
+        """
+        callback_tasks = set()
+        callback_errors = []
+
+        def callback_done(task: asyncio.Task) -> None:
+            callback_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                callback_errors.append(task.exception())
+
+        deadline = time.monotonic()
+        try:
+            while True:
+                if callback_errors:
+                    raise callback_errors[0]
+
+                reading = await self.get_reading_async(units=units)
+
+                if inspect.iscoroutinefunction(callback):
+                    task = asyncio.create_task(callback(reading))
+                    callback_tasks.add(task)
+                    task.add_done_callback(callback_done)
+                elif callback is not None:
+                    callback(reading)
+
+                deadline = _next_deadline(deadline, self.config.capture_delay)
+                await asyncio.sleep(max(0., deadline - time.monotonic()))
+        finally:
+            for task in callback_tasks:
+                task.cancel()
+            await asyncio.gather(*callback_tasks, return_exceptions=True)
+
+    async def get_reading_async(self, **kwargs) -> dict:
+        """ Get a single reading without blocking the event loop.
+
+        The reading is taken in a worker thread. Each query holds the serial
+        lock for its whole transaction, so a cancelled call whose thread is
+        still running can't interleave with the next one.
+
+        Args:
+            **kwargs: Keyword arguments for `get_reading`.
+
+        Returns:
+            A dictionary of readings.
+        """
+        return await asyncio.to_thread(self.get_reading, **kwargs)
+
     def get_reading(self, units: WhichUnits = 'none', get_errors: bool = False, avg_times: int = 3) -> dict:
         """ Get a single reading of all values.
 
         Args:
-            units: The astropy units to return the reading in, default 'none',
-                can be 'metric' or 'imperial'.
+            units: The units to return the reading in, default 'none', which
+                is the same as 'metric'. Can also be 'imperial'.
             get_errors: Whether to get the internal errors, default False.
             avg_times: The number of times to average the readings, default 3.
 
         Returns:
             A dictionary of readings.
         """
+        commands = self._reading_commands
 
-        def avg_times(fn, n=avg_times):
-            return round(sum(fn() for _ in range(n)) / n, 3)
+        # Send all the commands in one batch, repeated for averaging, with the PWM last.
+        responses = self.query_batch(commands * avg_times + (WeatherCommand.GET_PWM,))
+        pwm = responses.pop()
+
+        # Group the repeated responses by command.
+        values = {cmd: responses[i::len(commands)] for i, cmd in enumerate(commands)}
+        wind_speeds = values.get(WeatherCommand.GET_WINDSPEED)
 
         reading = {
             'timestamp': datetime.now().isoformat(),
-            'ambient_temp': avg_times(self.get_ambient_temperature),
-            'sky_temp': avg_times(self.get_sky_temperature),
-            'wind_speed': avg_times(self.get_wind_speed),
-            'rain_frequency': avg_times(self.get_rain_frequency),
-            'pwm': self.get_pwm(),
+            'ambient_temp': _average(values[WeatherCommand.GET_SENSOR_TEMP], 1 / TEMPERATURE_DIVISOR),
+            'sky_temp': _average(values[WeatherCommand.GET_SKY_TEMP], 1 / TEMPERATURE_DIVISOR),
+            'wind_speed': _average(wind_speeds, WIND_SPEED_FACTOR) if wind_speeds else None,
+            'rain_frequency': _average(values[WeatherCommand.GET_RAIN_FREQUENCY]),
+            'pwm': pwm * PWM_TO_PERCENT,
         }
 
         if get_errors:
-            reading.update(**{f'error_{i:02d}': err for i, err in enumerate(self.get_errors())})
+            for i, err in enumerate(self.get_errors()):
+                reading[f'error_{i:02d}'] = err
 
         # Add the safety values.
         reading = self.get_safe_reading(reading)
 
-        # Add astropy units if requested.
-        if units != 'none':
-            # First make them metric units.
-            reading['ambient_temp'] *= u.Celsius
-            reading['sky_temp'] *= u.Celsius
-            reading['wind_speed'] *= u.m / u.s
-            reading['pwm'] *= u.percent
-            # Then convert if needed.
-            if units == 'imperial':
-                reading['ambient_temp'] = reading['ambient_temp'].to(u.imperial.deg_F, equivalencies=u.temperature())
-                reading['sky_temp'] = reading['sky_temp'].to(u.imperial.deg_F, equivalencies=u.temperature())
-                reading['wind_speed'] = reading['wind_speed'].to(u.imperial.mile / u.hour)
-
-        self.readings.append(reading)
+        # Readings are stored in metric, only the returned reading is converted.
+        reading_json = json.dumps(reading).encode()
+        with self.readings_lock:
+            self.readings.append(reading)
+            self.readings_json.append(reading_json)
+
+        return self.convert_units(reading, units)
+
+    @staticmethod
+    def convert_units(reading: dict, units: WhichUnits) -> dict:
+        """ Converts a metric reading to the requested units.
+
+        Args:
+            reading: The reading to convert.
+            units: The units to convert to. Only 'imperial' changes the values.
+
+        Returns:
+            The reading itself if no conversion is needed, otherwise a converted copy.
+        """
+        if units != 'imperial':
+            return reading
+
+        reading = reading.copy()
+        for field, (scale, offset) in IMPERIAL_CONVERSIONS.items():
+            if reading[field] is not None:
+                reading[field] = reading[field] * scale + offset
 
         return reading
 
@@ -179,41 +363,35 @@ class CloudSensor(object):
         Returns:
             The reading with the safety values added.
         """
-        reading['cloud_condition'] = 'unknown'
-        temp_diff = reading['sky_temp'] - reading['ambient_temp']
-        if temp_diff >= self.thresholds.very_cloudy:
-            reading['cloud_condition'] = 'very cloudy'
-        elif temp_diff >= self.thresholds.cloudy:
-            reading['cloud_condition'] = 'cloudy'
-        else:
-            reading['cloud_condition'] = 'clear'
-
-        reading['wind_condition'] = 'unknown'
-        if reading['wind_speed'] is not None:
-            if reading['wind_speed'] >= self.thresholds.very_gusty:
-                reading['wind_condition'] = 'very gusty'
-            elif reading['wind_speed'] >= self.thresholds.gusty:
-                reading['wind_condition'] = 'gusty'
-            elif reading['wind_speed'] >= self.thresholds.very_windy:
-                reading['wind_condition'] = 'very windy'
-            elif reading['wind_speed'] >= self.thresholds.windy:
-                reading['wind_condition'] = 'windy'
-            else:
-                reading['wind_condition'] = 'calm'
-
-        reading['rain_condition'] = 'unknown'
-        if reading['rain_frequency'] <= self.thresholds.rainy:
-            reading['rain_condition'] = 'rainy'
-        elif reading['rain_frequency'] <= self.thresholds.wet:
-            reading['rain_condition'] = 'wet'
-        else:
-            reading['rain_condition'] = 'dry'
-
-        reading['cloud_safe'] = True if reading['cloud_condition'] == 'clear' else False
-        reading['wind_safe'] = True if reading['wind_condition'] == 'calm' else False
-        reading['rain_safe'] = True if reading['rain_condition'] == 'dry' else False
+        # The thresholds are read on every check so changes to the config apply.
+        thresholds = self.thresholds
+        cloud_thresholds = (thresholds.cloudy, thresholds.very_cloudy)
+        wind_thresholds = (thresholds.windy, thresholds.very_windy, thresholds.gusty, thresholds.very_gusty)
+        rain_thresholds = (thresholds.rainy, thresholds.wet)
 
-        reading['is_safe'] = True if reading['cloud_safe'] and reading['wind_safe'] and reading['rain_safe'] else False
+        temp_diff = reading['sky_temp'] - reading['ambient_temp']
+        wind_speed = reading['wind_speed']
+
+        # A value equal to a threshold is in the worse band: at or above for
+        # clouds and wind, at or below for rain.
+        cloud_condition = CLOUD_CONDITIONS[bisect.bisect_right(cloud_thresholds, temp_diff)]
+        wind_condition = ('unknown' if wind_speed is None
+                          else WIND_CONDITIONS[bisect.bisect_right(wind_thresholds, wind_speed)])
+        rain_condition = RAIN_CONDITIONS[bisect.bisect_left(rain_thresholds, reading['rain_frequency'])]
+
+        cloud_safe = cloud_condition == 'clear'
+        wind_safe = wind_condition == 'calm'
+        rain_safe = rain_condition == 'dry'
+
+        reading.update(
+            cloud_condition=cloud_condition,
+            wind_condition=wind_condition,
+            rain_condition=rain_condition,
+            cloud_safe=cloud_safe,
+            wind_safe=wind_safe,
+            rain_safe=rain_safe,
+            is_safe=cloud_safe and wind_safe and rain_safe,
+        )
 
         return reading
 
@@ -225,7 +403,7 @@ class CloudSensor(object):
         """
         responses = self.query(WeatherCommand.GET_INTERNAL_ERRORS, return_codes=True)
 
-        for i, response in enumerate(responses.copy()):
+        for i, response in enumerate(responses):
             responses[i] = int(response[2:])
 
         return responses
@@ -236,7 +414,7 @@ class CloudSensor(object):
         Returns:
             The sky temperature in Celsius.
         """
-        return self.query(WeatherCommand.GET_SKY_TEMP) / 100.
+        return self.query(WeatherCommand.GET_SKY_TEMP) / TEMPERATURE_DIVISOR
 
     def get_ambient_temperature(self) -> float:
         """Gets the latest ambient temperature reading.
@@ -244,7 +422,7 @@ class CloudSensor(object):
         Returns:
             The ambient temperature in Celsius.
         """
-        return self.query(WeatherCommand.GET_SENSOR_TEMP) / 100.
+        return self.query(WeatherCommand.GET_SENSOR_TEMP) / TEMPERATURE_DIVISOR
 
     def get_rain_sensor_values(self) -> list[float]:
         """Gets the latest sensor values.
@@ -254,15 +432,10 @@ class CloudSensor(object):
         """
         responses = self.query(WeatherCommand.GET_VALUES, return_codes=True)
 
-        for i, response in enumerate(responses.copy()):
-            if response.startswith(WeatherResponseCodes.GET_VALUES_AMBIENT):
-                responses[i] = response[2:] / 100.
-            elif response.startswith(WeatherResponseCodes.GET_VALUES_LDR_VOLTAGE):
-                responses[i] = response[2:]
-            elif response.startswith(WeatherResponseCodes.GET_VALUES_SENSOR_TEMP):
-                responses[i] = float(response[2:]) / 100.
-            elif response.startswith(WeatherResponseCodes.GET_VALUES_ZENER_VOLTAGE):
-                responses[i] = response[2:]
+        for i, response in enumerate(responses):
+            parser = RAIN_SENSOR_PARSERS.get(response[:2])
+            if parser is not None:
+                responses[i] = parser(response[2:])
 
         return responses
 
@@ -280,7 +453,7 @@ class CloudSensor(object):
         Returns:
             The PWM value as a percentage.
         """
-        return self.query(WeatherCommand.GET_PWM, parse_type=int) / 1023 * 100
+        return self.query(WeatherCommand.GET_PWM, parse_type=int) * PWM_TO_PERCENT
 
     def set_pwm(self, percent: float) -> bool:
         """Sets the PWM value.
@@ -288,9 +461,8 @@ class CloudSensor(object):
         Returns:
             True if successful, False otherwise.
         """
-        percent = min(100, max(0, int(percent)))
-        percent = int(percent * 1023 / 100)
-        return self.query(WeatherCommand.SET_PWM, cmd_params=f'{percent:04d}')
+        pwm = min(PWM_MAX, max(0, round(percent * PERCENT_TO_PWM)))
+        return self.query(WeatherCommand.SET_PWM, cmd_params=f'{pwm:04d}')
 
     def get_wind_speed(self) -> float | None:
         """ Gets the wind speed.
@@ -300,7 +472,7 @@ class CloudSensor(object):
         """
         if self.has_anemometer:
             ws = self.query(WeatherCommand.GET_WINDSPEED)
-            ws *= 0.84
+            ws *= WIND_SPEED_FACTOR
             # The manual says to add 3 km/h to the reading but that seems off.
             # ws += 3 * u.km / u.hour
             return ws
@@ -325,19 +497,79 @@ class CloudSensor(object):
         Returns:
             The response from the sensor.
          """
-        self.write(cmd, *args, **kwargs)
-        response = self.read(*args, **kwargs)
+        return_raw = kwargs.get('return_raw', False)
+        with self._serial_lock:
+            try:
+                self.write(cmd, *args, **kwargs)
+                return self._parse_response(cmd, self.read(*args, **kwargs), return_codes, parse_type, return_raw)
+            except Exception:
+                self._resync()
+                raise
+
+    def query_batch(self, cmds: Sequence[WeatherCommand],
+                    return_codes: bool = False,
+                    parse_type: type = float, *args, **kwargs) -> list:
+        """ Queries the sensor with several commands at once.
+
+        All the commands are sent in a single write and the responses are then
+        read back in order, so the round-trip to the sensor is paid once rather
+        than once per command. Only commands without parameters can be batched.
+
+        Args:
+            cmds: The commands to send to the sensor.
+            return_codes: Whether to return the response codes, default False.
+            parse_type: The type to parse the responses as, default float.
+            *args: Additional arguments to pass to `read`.
+            **kwargs: Additional keyword arguments to pass to `read`.
+
+        Returns:
+            A list with the response for each command.
+        """
+        return_raw = kwargs.get('return_raw', False)
+        with self._serial_lock:
+            try:
+                self._sensor.write(b''.join(COMMAND_BYTES[cmd] for cmd in cmds))
+                return [
+                    self._parse_response(cmd, self.read(*args, **kwargs), return_codes, parse_type, return_raw)
+                    for cmd in cmds
+                ]
+            except Exception:
+                self._resync()
+                raise
+
+    def _parse_response(self, cmd: WeatherCommand, response: list | str,
+                        return_codes: bool, parse_type: type,
+                        return_raw: bool = False) -> list | str | float | int | bool:
+        """ Strips the response code and parses the value of a response.
+
+        Raw responses from `read(return_raw=True)` are returned unchanged.
+
+        Raises:
+            ValueError: If the response doesn't start with the code for `cmd`,
+                e.g. because it was a stale response to an earlier command.
+        """
+        if return_raw:
+            return response
 
         if len(response) == 1:
             response = response[0]
 
+        code = RESPONSE_CODES.get(cmd)
+        if code is not None and not (isinstance(response, str) and response.startswith(code)):
+            raise ValueError(f'Unexpected response to {cmd.name}: {response!r}')
+
         if return_codes is False:
-            response = re.sub(WeatherResponseCodes[cmd.name], '', response)
+            response = response.removeprefix(code)
             with suppress(ValueError):
                 response = parse_type(response)
 
         return response
 
+    def _resync(self) -> None:
+        """Discards any pending input so the next response lines up with its command."""
+        self._sensor.reset_input_buffer()
+        self._read_buf.clear()
+
     def write(self, cmd: WeatherCommand, cmd_params: str = '', cmd_delim: str = '!', *args, **kwargs) -> int:
         """Writes a command to the sensor.
 
@@ -352,6 +584,9 @@ class CloudSensor(object):
         Returns:
             The number of bytes written.
         """
+        if not cmd_params and cmd_delim == '!':
+            return self._sensor.write(COMMAND_BYTES[cmd])
+
         full_cmd = f'{cmd.value}{cmd_params}{cmd_delim}'
         return self._sensor.write(full_cmd.encode())
 
@@ -376,20 +611,54 @@ class CloudSensor(object):
         Returns:
             The response from the sensor.
         """
-        response = self._sensor.read_until(self.handshake_block).decode()
+        raw = self._read_exactly(HANDSHAKE_BLOCK, self._sensor.timeout)
         if verbose:
-            print(f'Raw response: {response!r}')
+            print(f'Raw response: {raw.decode("ascii")!r}')
+
+        if return_raw:
+            return raw.decode('ascii')
+
+        # The response always ends with the handshake block, so just check
+        # that it is made of whole blocks.
+        if len(raw) % BLOCK_SIZE:
+            raise ValueError(f'Invalid response {raw!r}')
+
+        # The blocks are fixed width, so slice out each one without the leading
+        # '!', with each item containing both the response code and the data.
+        return [
+            raw[i + 1:i + BLOCK_SIZE].decode('ascii')
+            for i in range(0, len(raw) - BLOCK_SIZE, BLOCK_SIZE)
+            if raw[i] == ord('!')
+        ]
 
-        if not return_raw:
-            # Split into a list of blocks, with each item containing both the
-            # response code and the data.
-            response = re.findall(r"!(.{14})", response)
+    def _read_exactly(self, suffix: bytes, timeout: float) -> bytes:
+        """Reads from the sensor up to and including the `suffix`.
 
-            # Check that the handshake block is valid.
-            handshake_block = response.pop()
-            if re.match(self.handshake_block, handshake_block) is None:
-                raise ValueError(f'Invalid handshake block {handshake_block!r}')
+        Reads whatever is waiting on the port rather than one byte at a time
+        and returns as soon as the suffix is seen. Bytes received after the
+        suffix, e.g. from a batch of queries, are kept for the next read.
 
+        Args:
+            suffix: The bytes that end the response.
+            timeout: The number of seconds to wait for the suffix.
+
+        Returns:
+            The bytes read, including the suffix.
+        """
+        deadline = time.monotonic() + timeout
+        buf = self._read_buf
+        while (end := buf.find(suffix)) == -1:
+            if time.monotonic() > deadline:
+                # Drop the rest of any response still arriving so it isn't
+                # read as the answer to the next command.
+                self._resync()
+                raise TimeoutError(f'No response from sensor after {timeout} seconds')
+            # If nothing is waiting, block until the rest of the current block arrives.
+            buf += self._sensor.read(self._sensor.in_waiting or BLOCK_SIZE - len(buf) % BLOCK_SIZE)
+
+        end += len(suffix)
+        response = bytes(buf[:end])
+        del buf[:end]
         return response
 
     def __str__(self):
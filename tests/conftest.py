@@ -1,10 +1,60 @@
-"""
-    Dummy conftest.py for aag.
+"""Fixtures for the aag tests."""
 
-    If you don't know what this is for, just leave it empty.
-    Read more about conftest.py under:
-    - https://docs.pytest.org/en/stable/fixture.html
-    - https://docs.pytest.org/en/stable/writing_plugins.html
-"""
+import threading
+import time
 
-# import pytest
+import pytest
+from serial.urlhandler.protocol_loop import Serial as LoopSerial
+
+from aag.weather import CloudSensor
+
+
+class FakeCloudWatcher(LoopSerial):
+    """A loop serial port that answers commands like a CloudWatcher."""
+    responses = {
+        'A': ['N CloudWatcher'],
+        'B': ['V         5.89'],
+        'K': ['K0123         '],
+        'C': ['3          123', '4          456', '5         2100', '6          789'],
+        'D': ['E1           1', 'E2           2', 'E3           3', 'E4           4'],
+        'E': ['R         2600'],
+        'P': ['Q            0'],
+        'Q': ['Q          512'],
+        'S': ['1        -2000'],
+        'T': ['2         2000'],
+        'V': ['w           10'],
+        'v': ['v            1'],
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.commands = []
+        # Seconds each read takes, and the most threads seen using the port at once.
+        self.read_delay = 0
+        self.max_users = 0
+        self._users = set()
+        super().__init__(*args, **kwargs)
+
+    def read(self, size=1):
+        self._users.add(threading.get_ident())
+        self.max_users = max(self.max_users, len(self._users))
+        try:
+            time.sleep(self.read_delay)
+            return super().read(size)
+        finally:
+            self._users.discard(threading.get_ident())
+
+    def write(self, data):
+        for cmd in data.decode().split('!')[:-1]:
+            self.commands.append(cmd)
+            response = self.responses[cmd[0]] + ['\x11            0']
+            super().write(''.join(f'!{block}' for block in response).encode())
+        return len(data)
+
+
+@pytest.fixture
+def sensor():
+    """A CloudSensor connected to a fake CloudWatcher."""
+    cloud_sensor = CloudSensor(connect=False, serial_port='loop://')
+    cloud_sensor._sensor = FakeCloudWatcher('loop://', timeout=1)
+    cloud_sensor.connect()
+    return cloud_sensor
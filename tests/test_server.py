@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from aag import server
+
+
+@pytest.fixture
+def client(sensor, monkeypatch):
+    """A client for the app, using the fake sensor instead of the startup one."""
+    monkeypatch.setattr(server, 'sensor', sensor)
+    return TestClient(server.app)
+
+
+def test_weather(client, sensor):
+    assert client.get('/weather').json() == []
+
+    # Readings taken outside the periodic task are served too.
+    sensor.get_reading()
+    sensor.get_reading(units='imperial')
+    response = client.get('/weather')
+    assert response.headers['content-type'] == 'application/json'
+    assert response.json() == list(sensor.readings)
+    assert response.json()[-1]['ambient_temp'] == 20
+
+
+def test_periodic_reading(client, sensor):
+    reading = asyncio.run(server.get_reading.__wrapped__())
+    assert reading['ambient_temp'] == 20
+    assert client.get('/weather').json() == [reading]
@@ -1,6 +1,14 @@
+import asyncio
 import os
+import threading
+import time
+from contextlib import suppress
+
 import pytest
+from serial.urlhandler.protocol_loop import Serial as LoopSerial
 
+from aag.commands import WeatherCommand
+from aag.settings import Thresholds
 from aag.weather import CloudSensor
 
 
@@ -124,3 +132,272 @@ def test_get_safe_reading():
     reading['rain_frequency'] = 2300
     reading = sensor.get_safe_reading(reading=reading)
     assert reading['rain_condition'] == 'dry'
+
+
+def test_read_response():
+    sensor = CloudSensor(connect=False, serial_port='loop://')
+    sensor._sensor.open()
+
+    # The loop port echoes back what is written, so write a fake response.
+    sensor._sensor.write(b'!2        -1234!\x11            0')
+    assert sensor.read() == ['2        -1234']
+
+    # A response that isn't made of whole blocks is invalid.
+    sensor._sensor.write(b'!2 -1234!\x11            0')
+    with pytest.raises(ValueError):
+        sensor.read()
+
+    # A response without the handshake block times out.
+    sensor._sensor.timeout = 0.1
+    sensor._sensor.write(b'!2        -1234')
+    with pytest.raises(TimeoutError):
+        sensor.read()
+
+
+def test_connect_fake(sensor):
+    assert sensor.is_connected
+    assert sensor.serial_number == '0123'
+    assert sensor.has_anemometer is True
+
+
+def test_no_anemometer(sensor):
+    sensor._sensor.responses = {**sensor._sensor.responses, 'v': ['v            0']}
+    assert sensor.connect()
+    assert sensor.has_anemometer is False
+
+    reading = sensor.get_reading()
+    assert reading['wind_speed'] is None
+    assert reading['wind_condition'] == 'unknown'
+    assert 'V' not in sensor._sensor.commands[-10:]
+
+
+def test_query_batch(sensor):
+    responses = sensor.query_batch([WeatherCommand.GET_SKY_TEMP, WeatherCommand.GET_SENSOR_TEMP])
+    assert responses == [-2000, 2000]
+
+
+def test_query_raw(sensor):
+    raw = '!1        -2000!\x11            0'
+    assert sensor.query(WeatherCommand.GET_SKY_TEMP, return_raw=True) == raw
+    assert sensor.query_batch([WeatherCommand.GET_SKY_TEMP, WeatherCommand.GET_SKY_TEMP],
+                              return_raw=True) == [raw, raw]
+
+
+def test_stale_response(sensor):
+    # A stale response left on the port throws off the pairing of responses
+    # with commands, so the reading fails and the pending input is dropped.
+    LoopSerial.write(sensor._sensor, b'!1        -2000!\x11            0')
+    with pytest.raises(ValueError):
+        sensor.get_reading()
+    assert sensor._sensor.in_waiting == 0
+
+    reading = sensor.get_reading()
+    assert reading['ambient_temp'] == 20
+    assert reading['sky_temp'] == -20
+
+    # Reconnecting an open port also drops stale input.
+    LoopSerial.write(sensor._sensor, b'!1        -2000!\x11            0')
+    assert sensor.connect(raise_exceptions=False) is True
+    assert sensor.name == 'CloudWatcher'
+    assert sensor.get_reading()['ambient_temp'] == 20
+
+
+def test_get_reading(sensor):
+    reading = sensor.get_reading()
+    assert reading['ambient_temp'] == 20
+    assert reading['sky_temp'] == -20
+    assert reading['wind_speed'] == 8.4
+    assert reading['rain_frequency'] == 2600
+    assert reading['pwm'] == pytest.approx(50.05, abs=0.01)
+    assert reading['is_safe'] is True
+    assert sensor.status == reading
+
+    reading = sensor.get_reading(units='imperial', get_errors=True)
+    assert reading['ambient_temp'] == 68
+    assert reading['sky_temp'] == -4
+    assert reading['wind_speed'] == pytest.approx(5.22, abs=0.01)
+    assert reading['error_00'] == 1
+
+    # The stored reading stays metric.
+    assert sensor.status['ambient_temp'] == 20
+
+
+def test_capture(sensor):
+    sensor.config.capture_delay = 0.05
+    readings = []
+
+    def callback(reading):
+        readings.append(reading)
+        if len(readings) == 3:
+            raise KeyboardInterrupt
+
+    start = time.monotonic()
+    sensor.capture(callback=callback)
+    assert len(readings) == 3
+    assert time.monotonic() - start >= 0.1
+
+
+def test_capture_async(sensor):
+    sensor.config.capture_delay = 0.01
+    readings = []
+
+    async def callback(reading):
+        readings.append(reading)
+
+    async def capture():
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(sensor.capture_async(callback=callback), timeout=0.5)
+
+    asyncio.run(capture())
+    assert len(readings) > 1
+    assert readings[-1]['is_safe'] is True
+
+
+def test_capture_async_callback_error(sensor):
+    sensor.config.capture_delay = 0.01
+    calls = []
+
+    async def callback(reading):
+        calls.append(reading)
+        raise RuntimeError('bad callback')
+
+    async def capture():
+        await asyncio.wait_for(sensor.capture_async(callback=callback), timeout=0.5)
+
+    with pytest.raises(RuntimeError, match='bad callback'):
+        asyncio.run(capture())
+    assert len(calls) == 1
+
+
+def test_capture_async_cancels_callbacks(sensor):
+    sensor.config.capture_delay = 0.01
+    cancelled = []
+
+    async def callback(reading):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(reading)
+            raise
+
+    async def capture():
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(sensor.capture_async(callback=callback), timeout=0.2)
+        return len(asyncio.all_tasks()) - 1
+
+    assert asyncio.run(capture()) == 0
+    assert len(cancelled) > 1
+
+
+def test_get_reading_async(sensor):
+    async def get_readings():
+        return await asyncio.gather(*[sensor.get_reading_async() for _ in range(3)])
+
+    readings = asyncio.run(get_readings())
+    assert [r['ambient_temp'] for r in readings] == [20, 20, 20]
+    assert len(sensor.readings) == 3
+
+
+def test_get_reading_async_cancelled(sensor):
+    sensor._sensor.read_delay = 0.1
+
+    async def get_readings():
+        # The worker thread keeps going after the wait is cancelled.
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(sensor.get_reading_async(), timeout=0.02)
+        return await sensor.get_reading_async()
+
+    reading = asyncio.run(get_readings())
+    assert reading['ambient_temp'] == 20
+    assert sensor._sensor.max_users == 1
+
+
+def test_connect_waits_for_port(sensor):
+    # A reconnect must not flush the port in the middle of another transaction.
+    LoopSerial.write(sensor._sensor, b'!1        -2000!\x11            0')
+    with sensor._serial_lock:
+        thread = threading.Thread(target=sensor.connect)
+        thread.start()
+        thread.join(timeout=0.1)
+        assert thread.is_alive()
+        assert sensor._sensor.in_waiting == 30
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert sensor.name == 'CloudWatcher'
+
+
+def test_readings_stay_in_step(sensor):
+    with sensor.readings_lock:
+        thread = threading.Thread(target=sensor.get_reading)
+        thread.start()
+        thread.join(timeout=0.1)
+        assert thread.is_alive()
+        assert len(sensor.readings) == len(sensor.readings_json) == 0
+    thread.join(timeout=5)
+    assert len(sensor.readings) == len(sensor.readings_json) == 1
+
+
+def test_get_safe_reading_thresholds():
+    sensor = CloudSensor(connect=False, serial_port='loop://')
+    thresholds = sensor.thresholds
+
+    # Values on a threshold fall in the worse condition.
+    reading = {
+        'ambient_temp': 0,
+        'sky_temp': thresholds.cloudy,
+        'wind_speed': thresholds.windy,
+        'rain_frequency': thresholds.rainy,
+    }
+    reading = sensor.get_safe_reading(reading)
+    assert reading['cloud_condition'] == 'cloudy'
+    assert reading['wind_condition'] == 'windy'
+    assert reading['rain_condition'] == 'rainy'
+
+    reading['sky_temp'] = thresholds.very_cloudy
+    reading['wind_speed'] = None
+    reading['rain_frequency'] = thresholds.wet
+    reading = sensor.get_safe_reading(reading)
+    assert reading['cloud_condition'] == 'very cloudy'
+    assert reading['wind_condition'] == 'unknown'
+    assert reading['rain_condition'] == 'wet'
+    assert reading['is_safe'] is False
+
+
+def test_thresholds_changed(sensor):
+    reading = {'ambient_temp': 0, 'sky_temp': -20, 'wind_speed': 60, 'rain_frequency': 2600}
+    assert sensor.get_safe_reading(reading)['cloud_condition'] == 'cloudy'
+
+    sensor.config.thresholds.cloudy = -15
+    sensor.config.thresholds.very_cloudy = -10
+    assert sensor.get_safe_reading(reading)['cloud_condition'] == 'clear'
+
+    sensor.config.thresholds = Thresholds(windy=70)
+    assert sensor.get_safe_reading(reading)['wind_condition'] == 'calm'
+
+    # Changing a single threshold is still checked.
+    with pytest.raises(ValueError, match='cloud'):
+        sensor.config.thresholds.cloudy = 10
+
+
+def test_thresholds_out_of_order(monkeypatch):
+    with pytest.raises(ValueError, match='cloud'):
+        Thresholds(cloudy=-10, very_cloudy=-20)
+
+    with pytest.raises(ValueError, match='rain'):
+        Thresholds(wet=1700)
+
+    monkeypatch.setenv('AAG_THRESHOLDS__GUSTY', '60')
+    with pytest.raises(ValueError, match='wind'):
+        CloudSensor(connect=False, serial_port='loop://')
+
+
+def test_get_rain_sensor_values(sensor):
+    assert sensor.get_rain_sensor_values() == [1.23, 456, 21, 789]
+
+
+def test_set_pwm(sensor):
+    for percent, cmd in [(50, 'P0512'), (0.1, 'P0001'), (150, 'P1023'), (-5, 'P0000')]:
+        sensor.set_pwm(percent)
+        assert sensor._sensor.commands[-1] == cmd
+
+    assert sensor.get_pwm() == pytest.approx(50.05, abs=0.01)